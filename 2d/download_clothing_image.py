@@ -1,18 +1,111 @@
 import os
 import sys
+import shutil
+import hashlib
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
 from PIL import Image
 from io import BytesIO
 
-def download_image_from_url(url, save_path):
-    """Download an image from a URL and save it to the given path."""
-    response = requests.get(url)
-    response.raise_for_status()
-    img = Image.open(BytesIO(response.content))
-    img.save(save_path)
+# Shared keep-alive session so repeated downloads reuse TCP/TLS connections
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                       max_retries=Retry(total=3, backoff_factor=0.2))
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+# Only advertise brotli when urllib3 has a decoder for it
+_SESSION.headers.update({
+    "Accept-Encoding": "gzip, br" if "br" in ACCEPT_ENCODING else "gzip",
+    "User-Agent": "pav-fitting/1.0",
+})
+TIMEOUT = (3.05, 30)  # (connect, read) seconds
+
+# Extension -> Content-Type that can be written to disk byte-for-byte
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+ALLOWED_CONTENT_TYPES = set(CONTENT_TYPES.values())
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+
+# Refuse decompression bombs well before PIL's default (~89 MP) limit. Checked
+# per download from the header, so PIL's process-wide limit is left alone.
+MAX_PIXELS = 40_000_000
+
+def download_image_from_url(url, save_path, max_size=None):
+    """
+    Download an image from a URL and save it to the given path. If
+    `save_path` has no extension, one is taken from the response
+    Content-Type. Non-image responses are rejected from their headers, before
+    the body is read. With `max_size` (w, h), JPEGs are decoded by libjpeg at
+    the smallest 1/2, 1/4 or 1/8 scale that is still at least `max_size`.
+    Returns the path written.
+    """
+    if urlparse(url).scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported URL: {url}")
+    with _SESSION.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type not in ALLOWED_CONTENT_TYPES:
+            raise ValueError(f"Unsupported Content-Type {content_type!r} for {url}")
+        ext = os.path.splitext(save_path)[1].lower()
+        if not ext:
+            ext = EXTENSIONS[content_type]
+            save_path += ext
+        if max_size is None and CONTENT_TYPES.get(ext) == content_type:
+            # Already in the target format: stream straight to disk, no decode/re-encode
+            response.raw.decode_content = True
+            with open(save_path, "wb") as f:
+                shutil.copyfileobj(response.raw, f, length=1 << 20)
+        else:
+            img = Image.open(BytesIO(response.content))
+            if img.size[0] * img.size[1] > MAX_PIXELS:
+                raise ValueError(f"Image {img.size[0]}x{img.size[1]} exceeds {MAX_PIXELS} pixels: {url}")
+            if max_size is not None and img.format == "JPEG":
+                img.draft("RGB", max_size)
+            if CONTENT_TYPES.get(ext) == "image/jpeg" and img.mode not in ("RGB", "L", "CMYK"):
+                # PNG/WebP with alpha or a palette cannot be written as JPEG directly
+                img = img.convert("RGB")
+            img.save(save_path)
     print(f"[INFO] Downloaded image from {url} to {save_path}")
+    return save_path
+
+def _download_one(url, out_dir):
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    if ext not in CONTENT_TYPES:
+        ext = ""  # picked from the response Content-Type
+    save_path = os.path.join(out_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ext)
+    try:
+        return download_image_from_url(url, save_path)
+    except Exception as e:
+        print(f"[WARN] Failed to download {url}: {e}")
+        return None
+
+def download_many(urls, out_dir, workers=8):
+    """
+    Download many image URLs concurrently through the shared session.
+    Files are named by the SHA-1 of their URL. Returns the saved paths in
+    input order (None for URLs that failed).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda url: _download_one(url, out_dir), urls))
 
 if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "-i":
+        # Batch mode: one URL per line
+        with open(sys.argv[2]) as f:
+            urls = [line.strip() for line in f if line.strip()]
+        out_dir = sys.argv[3] if len(sys.argv) > 3 else "downloads"
+        paths = download_many(urls, out_dir)
+        print(f"[INFO] Downloaded {sum(p is not None for p in paths)}/{len(urls)} images to {out_dir}")
+        sys.exit(0)
     if len(sys.argv) > 1:
         url = sys.argv[1]
     else:
@@ -1,55 +1,155 @@
 import os
+import functools
 import torch
 from PIL import Image
 import numpy as np
 from torchvision import transforms
 
+try:
+    import cv2  # optional: mask cleanup
+except ImportError:
+    cv2 = None
+
+try:
+    import onnxruntime as ort  # optional: run an exported u2net.onnx instead of eager PyTorch
+except ImportError:
+    ort = None
+
 from u2net.model import U2NET  # This import works if you run from 2d folder
 
+DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+# Tried in order; only those available in the installed onnxruntime build are used
+ONNX_PROVIDERS = ['TensorrtExecutionProvider', 'CUDAExecutionProvider', 'CPUExecutionProvider']
+
+# 5x5 rectangular closing, split into separable 1x5 / 5x1 passes
+_K_H = np.ones((1, 5), np.uint8)
+_K_V = np.ones((5, 1), np.uint8)
+
+TRANSFORM = transforms.Compose([
+    transforms.Resize((320, 320)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
 def norm_pred(d):
-    ma = torch.max(d)
-    mi = torch.min(d)
+    # Min-max normalize each map in the batch independently
+    ma = d.amax(dim=(-2, -1), keepdim=True)
+    mi = d.amin(dim=(-2, -1), keepdim=True)
     dn = (d - mi) / (ma - mi)
     return dn
 
-def segment_clothing_with_u2net(input_path, output_path, model_path):
+@functools.lru_cache(maxsize=2)
+def _load_u2net(model_path, device='cpu'):
+    """Build U2NET and load its weights once per (model_path, device)."""
     net = U2NET(3, 1)
-    net.load_state_dict(torch.load(model_path, map_location='cpu'))
+    net.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
     net.eval()
+    return net.to(device)
 
-    image = Image.open(input_path).convert('RGB')
-    transform = transforms.Compose([
-        transforms.Resize((320, 320)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
-    image_tensor = transform(image).unsqueeze(0)
+@functools.lru_cache(maxsize=2)
+def _load_onnx(onnx_path):
+    """Create the ONNX Runtime session for an exported U2NET once per path."""
+    if onnx_path.endswith('.int8.onnx'):
+        # INT8 models from quantize_onnx target the CPU (VNNI) kernels
+        return ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    available = ort.get_available_providers()
+    return ort.InferenceSession(onnx_path, providers=[p for p in ONNX_PROVIDERS if p in available])
 
+def _load_model(model_path):
+    # .onnx -> ONNX Runtime session, anything else -> PyTorch state dict
+    if model_path.endswith('.onnx'):
+        if ort is None:
+            raise ImportError("onnxruntime is required to run an .onnx U2NET model")
+        return _load_onnx(model_path)
+    return _load_u2net(model_path, DEVICE)
+
+def export_onnx(model_path, onnx_path, opset=17):
+    """One-off model prep: export the PyTorch U2NET weights to ONNX with a dynamic batch axis."""
+    net = _load_u2net(model_path, 'cpu')
+    outputs = ['output'] + [f'side{i}' for i in range(1, 7)]
     with torch.no_grad():
-        d1, _, _, _, _, _, _ = net(image_tensor)
-        pred = d1[:, 0, :, :]
+        torch.onnx.export(net, torch.randn(1, 3, 320, 320), onnx_path, opset_version=opset,
+                          input_names=['input'], output_names=outputs,
+                          dynamic_axes={name: {0: 'B'} for name in ['input'] + outputs})
+    print(f"[INFO] Exported U2NET to {onnx_path}")
+
+def quantize_onnx(onnx_path, int8_path, calibration_paths):
+    """
+    One-off model prep for CPU serving: statically quantize an exported U2NET
+    to INT8 (QDQ, per-channel weights), calibrated on representative clothing
+    images (~100 is plenty). Name the output *.int8.onnx so it runs on CPU.
+    """
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self, paths):
+            self._paths = iter(paths)
+
+        def get_next(self):
+            path = next(self._paths, None)
+            if path is None:
+                return None
+            image = Image.open(path).convert('RGB')
+            return {'input': TRANSFORM(image).unsqueeze(0).numpy()}
+
+    quantize_static(onnx_path, int8_path, _Reader(calibration_paths),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    print(f"[INFO] Saved INT8 U2NET to {int8_path}")
+
+def _predict(net, batch):
+    """Run U2NET on a (B, 3, 320, 320) batch; returns the raw (B, 1, 320, 320) maps on DEVICE."""
+    if ort is not None and isinstance(net, ort.InferenceSession):
+        out = net.run(['output'], {'input': batch.numpy()})[0]
+        return torch.from_numpy(out).to(DEVICE)
+    batch = batch.to(DEVICE, non_blocking=True)
+    # FP16 autocast on GPU (Tensor Core convs); plain FP32 on CPU
+    with torch.inference_mode(), torch.autocast(DEVICE, dtype=torch.float16, enabled=DEVICE == 'cuda'):
+        d1, _, _, _, _, _, _ = net(batch)
+    return d1[:, :1].float()
+
+def _binary_mask(pred, size):
+    """Upsample one (1, 320, 320) map to `size` (w, h), normalize and threshold it on-device."""
+    with torch.inference_mode():
+        pred = torch.nn.functional.interpolate(pred.unsqueeze(0), size=size[::-1], mode='bilinear', align_corners=False)
         pred = norm_pred(pred)
-        pred = pred.squeeze().cpu().numpy()
-
-    # Resize mask to original image size
-    mask = Image.fromarray((pred * 255).astype(np.uint8)).resize(image.size, resample=Image.BILINEAR)
-    # Post-process: binarize mask to remove faint edges
-    mask_np = np.array(mask)
-    threshold = 128
-    binary_mask = (mask_np > threshold).astype(np.uint8) * 255
-    # Optionally, dilate/erode to clean up mask (requires cv2)
-    try:
-        import cv2
-        kernel = np.ones((5,5), np.uint8)
-        binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_CLOSE, kernel)
-    except ImportError:
-        pass
+        # Binarize mask to remove faint edges; only the uint8 mask leaves the device
+        mask_t = (pred > 0.5).to(torch.uint8).mul_(255)
+        return mask_t.squeeze().cpu().numpy()
+
+def _save_segmented(image, pred, output_path):
+    binary_mask = _binary_mask(pred, image.size)
+    # Optionally, close small holes in the mask (requires cv2): dilate then erode
+    if cv2 is not None:
+        m = cv2.dilate(binary_mask, _K_H)
+        m = cv2.dilate(m, _K_V)
+        m = cv2.erode(m, _K_H)
+        binary_mask = cv2.erode(m, _K_V)
     image_np = np.array(image)
     rgba = np.dstack((image_np, binary_mask))
     result = Image.fromarray(rgba, 'RGBA')
     result.save(output_path)
     print(f"[INFO] Saved segmented clothing to {output_path}")
 
+def segment_clothing_with_u2net(input_path, output_path, model_path):
+    net = _load_model(model_path)
+    image = Image.open(input_path).convert('RGB')
+    pred = _predict(net, TRANSFORM(image).unsqueeze(0))
+    _save_segmented(image, pred[0], output_path)
+
+def segment_clothing_batch(paths, out_paths, model_path, batch_size=16):
+    """
+    Segment many images with one U2NET forward pass per `batch_size` images,
+    amortizing kernel launches and Python overhead across the batch.
+    """
+    net = _load_model(model_path)
+    for start in range(0, len(paths), batch_size):
+        images = [Image.open(p).convert('RGB') for p in paths[start:start + batch_size]]
+        preds = _predict(net, torch.stack([TRANSFORM(image) for image in images]))
+        for image, pred, output_path in zip(images, preds, out_paths[start:start + batch_size]):
+            _save_segmented(image, pred, output_path)
+
 if __name__ == "__main__":
     # Use the image downloaded by download_clothing_image.py
     input_path = "downloaded_clothing.jpg"
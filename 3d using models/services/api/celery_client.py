@@ -0,0 +1,5 @@
+import os
+from celery import Celery
+
+# Producer only: tasks are dispatched by name and executed by the ML service workers
+celery_app = Celery('api', broker=os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
@@ -0,0 +1,16 @@
+import hashlib
+
+CACHE_CONTROL = "public, max-age=300"
+
+def weak_etag(*parts):
+    return 'W/"' + hashlib.md5("|".join(map(str, parts)).encode()).hexdigest() + '"'
+
+def cache_headers(etag):
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def is_not_modified(request, etag):
+    # If-None-Match uses weak comparison, so a strong "<hash>" from a client also matches
+    tags = request.headers.get("if-none-match")
+    if not tags:
+        return False
+    return any(tag.strip() in ("*", etag, etag[2:]) for tag in tags.split(","))
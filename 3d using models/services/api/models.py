@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, DateTime, JSON, ARRAY
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, DateTime, ARRAY, Index, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
@@ -6,7 +7,7 @@ Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
-    id = Column(String, primary_key=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     email = Column(String, unique=True, index=True)
     name = Column(String)
     auth_provider = Column(String)
@@ -14,17 +15,17 @@ class User(Base):
 
 class Profile(Base):
     __tablename__ = 'profiles'
-    user_id = Column(String, ForeignKey('users.id'), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True)
     height_cm = Column(Float)
     weight_kg = Column(Float)
     gender = Column(String)
     skin_tone = Column(String)
-    measurement_bundle_id = Column(String)
+    measurement_bundle_id = Column(UUID(as_uuid=True))
 
 class Photo(Base):
     __tablename__ = 'photos'
-    id = Column(String, primary_key=True)
-    user_id = Column(String, ForeignKey('users.id'))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), index=True)
     s3_key_raw = Column(String)
     s3_key_proc = Column(String)
     width = Column(Integer)
@@ -34,52 +35,62 @@ class Photo(Base):
 
 class Measurement(Base):
     __tablename__ = 'measurements'
-    id = Column(String, primary_key=True)
-    user_id = Column(String, ForeignKey('users.id'))
-    jsonb = Column(JSON)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), index=True)
+    jsonb = Column(JSONB)
     model_version = Column(String)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class Avatar(Base):
     __tablename__ = 'avatars'
-    id = Column(String, primary_key=True)
-    user_id = Column(String, ForeignKey('users.id'))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), index=True)
     type = Column(String)
     style = Column(String)
     s3_key_preview = Column(String)
     s3_key_source = Column(String)
-    smpl_params = Column(JSON)
+    smpl_params = Column(JSONB)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 class Garment(Base):
     __tablename__ = 'garments'
-    id = Column(String, primary_key=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     sku = Column(String)
     title = Column(String)
     brand = Column(String)
     category = Column(String)
     gender = Column(String)
-    size_map = Column(JSON)
-    colorways = Column(JSON)
-    images = Column(JSON)
-    segmentation_masks = Column(JSON)
+    size_map = Column(JSONB)
+    colorways = Column(JSONB)
+    images = Column(JSONB)
+    segmentation_masks = Column(JSONB)
     three_d_asset = Column(String)
     affiliate_link = Column(String)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class TryonSession(Base):
     __tablename__ = 'tryon_sessions'
-    id = Column(String, primary_key=True)
-    user_id = Column(String, ForeignKey('users.id'))
-    avatar_id = Column(String, ForeignKey('avatars.id'))
-    garment_ids = Column(ARRAY(String))
-    result_previews = Column(JSON)
+    __table_args__ = (
+        # "recent try-ons for a user"
+        Index('ix_tryon_user_created', 'user_id', 'created_at'),
+    )
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), index=True)
+    avatar_id = Column(UUID(as_uuid=True), ForeignKey('avatars.id'), index=True)
+    garment_ids = Column(ARRAY(UUID(as_uuid=True)))
+    # sha256 over avatar, sorted garments and pipeline version; identical try-ons share previews
+    key = Column(String, unique=True, index=True)
+    result_previews = Column(JSONB)
+    status = Column(String, default='pending')  # pending -> done | failed, set by the ML worker
+    task_id = Column(String)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 class Event(Base):
     __tablename__ = 'events'
-    id = Column(String, primary_key=True)
-    user_id = Column(String, ForeignKey('users.id'))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), index=True)
     type = Column(String)
-    payload = Column(JSON)
+    payload = Column(JSONB)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -3,16 +3,16 @@ from fastapi import APIRouter
 router = APIRouter(prefix="/auth")
 
 @router.post("/register")
-def register():
+async def register():
     # ...existing code...
     return {"msg": "register endpoint"}
 
 @router.post("/login")
-def login():
+async def login():
     # ...existing code...
     return {"msg": "login endpoint"}
 
 @router.post("/refresh")
-def refresh():
+async def refresh():
     # ...existing code...
     return {"msg": "refresh endpoint"}
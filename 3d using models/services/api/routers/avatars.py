@@ -1,13 +1,32 @@
-from fastapi import APIRouter
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import get_session
+from models import Avatar
+from storage import asset_url
+from http_cache import weak_etag, cache_headers, is_not_modified
 
 router = APIRouter(prefix="/avatars")
 
+class AvatarOut(BaseModel):
+    type: Optional[str] = None
+    style: Optional[str] = None
+    preview_url: Optional[str] = None
+
 @router.post("")
-def create_avatar():
+async def create_avatar():
     # ...existing code...
     return {"avatar_id": "uuid"}
 
-@router.get("/{id}")
-def get_avatar(id: str):
-    # ...existing code...
-    return {"type": "2d", "style": "freefire-like", "preview_url": "https://s3.example.com/avatars/uuid.png"}
+@router.get("/{id}", response_model=AvatarOut)
+async def get_avatar(id: UUID, request: Request, response: Response, session: AsyncSession = Depends(get_session)):
+    avatar = await session.get(Avatar, id)
+    if avatar is None:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    etag = weak_etag(avatar.s3_key_preview, avatar.updated_at)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    response.headers.update(cache_headers(etag))
+    return AvatarOut(type=avatar.type, style=avatar.style, preview_url=asset_url(avatar.s3_key_preview))
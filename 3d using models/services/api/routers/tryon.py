@@ -1,13 +1,116 @@
-from fastapi import APIRouter
+import datetime
+import hashlib
+from typing import List, Optional
+from uuid import UUID, uuid4
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import get_session
+from models import TryonSession
+from celery_client import celery_app
+from http_cache import weak_etag, cache_headers, is_not_modified
+from storage import asset_url
 
 router = APIRouter(prefix="/tryon")
 
-@router.post("")
-def tryon():
-    # ...existing code...
-    return {"preview_urls": ["https://s3.example.com/previews/uuid.png"], "layers": []}
+# Bump when the render pipeline changes so old previews stop being reused
+PIPELINE_VERSION = "1"
+# A pending render not finished by then is assumed lost (worker restart, dropped message) and re-sent
+PENDING_TIMEOUT = datetime.timedelta(minutes=5)
 
-@router.get("/{id}")
-def get_tryon(id: str):
-    # ...existing code...
-    return {"preview_urls": ["https://s3.example.com/previews/uuid.png"], "layers": []}
+class TryonRequest(BaseModel):
+    avatar_id: UUID
+    garment_ids: List[UUID]
+
+class TryonOut(BaseModel):
+    tryon_id: UUID
+    status: str
+    preview_urls: Optional[List[str]] = None
+    layers: Optional[list] = None
+
+def _dispatch_render(tryon_session):
+    # Executed by services/ml/workerrun.py, which sets the row's status to done (with the S3 keys
+    # of the previews in result_previews) or failed; a lost message is re-sent after PENDING_TIMEOUT
+    celery_app.send_task(
+        'tryon.render',
+        args=[str(tryon_session.id), str(tryon_session.avatar_id), [str(g) for g in tryon_session.garment_ids]],
+        task_id=tryon_session.task_id,
+        queue='ml.gpu',
+    )
+
+def _preview_urls(tryon_session):
+    return [asset_url(key) for key in tryon_session.result_previews or []]
+
+def tryon_key(avatar_id, garment_ids):
+    return hashlib.sha256("|".join([str(avatar_id), *sorted(map(str, garment_ids)), PIPELINE_VERSION]).encode()).hexdigest()
+
+def _needs_requeue(tryon_session):
+    if tryon_session.status == 'failed':
+        return True
+    return tryon_session.status == 'pending' and tryon_session.updated_at < datetime.datetime.utcnow() - PENDING_TIMEOUT
+
+async def _requeue(session, tryon_session):
+    # Conditional update, so of several concurrent retries only one dispatches a render
+    task_id = str(uuid4())
+    now = datetime.datetime.utcnow()
+    result = await session.execute(
+        update(TryonSession)
+        .where(
+            TryonSession.id == tryon_session.id,
+            (TryonSession.status == 'failed')
+            | ((TryonSession.status == 'pending') & (TryonSession.updated_at < now - PENDING_TIMEOUT)),
+        )
+        .values(status='pending', task_id=task_id, updated_at=now)
+    )
+    await session.commit()
+    if result.rowcount:
+        tryon_session.task_id = task_id
+        _dispatch_render(tryon_session)
+
+@router.post("", status_code=202, response_model=TryonOut, response_model_exclude_none=True)
+async def tryon(body: TryonRequest, response: Response, session: AsyncSession = Depends(get_session)):
+    """Queue the render on the ML service and return at once; poll GET /tryon/{id} for the previews"""
+    key = tryon_key(body.avatar_id, body.garment_ids)
+    tryon_session = await session.scalar(select(TryonSession).where(TryonSession.key == key))
+    if tryon_session is None:
+        # Identical requests can race past the select; only the one whose row lands dispatches
+        task_id = str(uuid4())
+        inserted = await session.scalar(
+            pg_insert(TryonSession)
+            .values(id=uuid4(), avatar_id=body.avatar_id, garment_ids=body.garment_ids, key=key,
+                    status='pending', task_id=task_id)
+            .on_conflict_do_nothing(index_elements=['key'])
+            .returning(TryonSession.id)
+        )
+        # Commit first so the worker always finds the row it is asked to fill in
+        await session.commit()
+        tryon_session = await session.scalar(select(TryonSession).where(TryonSession.key == key))
+        if inserted is not None:
+            _dispatch_render(tryon_session)
+            return TryonOut(tryon_id=tryon_session.id, status="pending")
+    if tryon_session.status == 'done':
+        response.status_code = 200
+        return TryonOut(tryon_id=tryon_session.id, status="done", preview_urls=_preview_urls(tryon_session), layers=[])
+    if _needs_requeue(tryon_session):
+        await _requeue(session, tryon_session)
+        return TryonOut(tryon_id=tryon_session.id, status="pending")
+    # Same try-on already queued
+    return TryonOut(tryon_id=tryon_session.id, status=tryon_session.status)
+
+@router.get("/{id}", response_model=TryonOut, response_model_exclude_none=True)
+async def get_tryon(id: UUID, request: Request, response: Response, session: AsyncSession = Depends(get_session)):
+    tryon_session = await session.get(TryonSession, id)
+    if tryon_session is None:
+        raise HTTPException(status_code=404, detail="Try-on session not found")
+    if tryon_session.status == 'pending' and _needs_requeue(tryon_session):
+        await _requeue(session, tryon_session)
+    if tryon_session.status != 'done':
+        response.status_code = 202 if tryon_session.status == 'pending' else 200
+        return TryonOut(tryon_id=tryon_session.id, status=tryon_session.status)
+    etag = weak_etag(tryon_session.result_previews, tryon_session.updated_at)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    response.headers.update(cache_headers(etag))
+    return TryonOut(tryon_id=tryon_session.id, status="done", preview_urls=_preview_urls(tryon_session), layers=[])
@@ -0,0 +1,11 @@
+import os
+
+# Public (CDN or bucket) base URL for rendered assets. URLs stay stable for a given key,
+# so they are safe to put behind the ETag/Cache-Control headers, unlike presigned URLs.
+S3_BUCKET = os.getenv('S3_BUCKET', 'virtualdressing')
+ASSET_BASE_URL = os.getenv('ASSET_BASE_URL', os.getenv('S3_ENDPOINT', 'http://localhost:9000') + '/' + S3_BUCKET)
+
+def asset_url(key):
+    if not key:
+        return None
+    return ASSET_BASE_URL.rstrip('/') + '/' + key.lstrip('/')
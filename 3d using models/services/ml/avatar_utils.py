@@ -1,46 +1,118 @@
-def export_uv_template(vertices, out_path="uv_template.png", texture_size=512):
-    """
-    Exports a UV layout template PNG for the current SMPL-X mesh.
-    The template can be used as a guide for designing fashion overlays.
-    """
-    import numpy as np
-    from PIL import Image, ImageDraw
-    # Simple planar UV mapping (same as used in fit_smplx_to_landmarks)
-    uv = np.zeros((vertices.shape[0], 2))
-    uv[:, 0] = (vertices[:, 0] - vertices[:, 0].min()) / (vertices[:, 0].max() - vertices[:, 0].min())
-    uv[:, 1] = (vertices[:, 1] - vertices[:, 1].min()) / (vertices[:, 1].max() - vertices[:, 1].min())
-    # Draw UV points
-    img = Image.new("RGBA", (texture_size, texture_size), (255,255,255,0))
-    draw = ImageDraw.Draw(img)
-    for u, v in uv:
-        x = int(u * (texture_size-1))
-        y = int((1-v) * (texture_size-1))  # Flip v for image coordinates
-        draw.ellipse((x-2, y-2, x+2, y+2), fill=(0,0,0,255))
-    img.save(out_path)
-    print(f"[INFO] UV template exported to {out_path}")
 import os
+import functools
 import numpy as np
 import torch
 import smplx
 import trimesh
 import cv2
-from PIL import Image, ImageDraw
-def fit_smplx_to_landmarks(landmarks, model_path, gender="neutral", out_path="avatar.obj", image_path=None, skin_color=None, eye_color=None, clothes_option=None):
-    model = smplx.SMPLX(model_path,
+from PIL import Image, ImageDraw, ImageFont
+from image_utils import detect_faces, extract_face_landmarks, crop_face
+
+try:
+    from numba import njit, prange  # optional: fast disk stamping
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _stamp_disks_kernel(buf, xs, ys, r, color):
+        h, w, c = buf.shape
+        r2 = r * r + r // 2
+        # Overlapping disks within one call share a colour, so racing writes are benign
+        for i in prange(xs.size):
+            for dy in range(-r, r + 1):
+                y = ys[i] + dy
+                if y < 0 or y >= h:
+                    continue
+                for dx in range(-r, r + 1):
+                    x = xs[i] + dx
+                    if dx * dx + dy * dy <= r2 and 0 <= x < w:
+                        for k in range(c):
+                            buf[y, x, k] = color[k]
+else:
+    _stamp_disks_kernel = None
+
+def export_uv_template(uv, out_path="uv_template.png", texture_size=512):
+    """
+    Exports a UV layout template PNG for the current SMPL-X mesh.
+    The template can be used as a guide for designing fashion overlays.
+    `uv` is the (V, 2) planar mapping from _planar_uv.
+    """
+    # Draw UV points: stamp a radius-2 disk at every vertex in one pass
+    xs = (uv[:, 0] * (texture_size-1)).astype(np.int32)
+    ys = ((1-uv[:, 1]) * (texture_size-1)).astype(np.int32)  # Flip v for image coordinates
+    buf = np.zeros((texture_size, texture_size, 4), np.uint8)
+    buf[..., :3] = 255
+    stamp_disks(buf, xs, ys, 2, (0, 0, 0, 255))
+    Image.fromarray(buf, "RGBA").save(out_path)
+    print(f"[INFO] UV template exported to {out_path}")
+
+def stamp_disks(buf, xs, ys, radius, color):
+    """
+    Paint a filled disk of `radius` at every (xs[i], ys[i]) into the HxWxC
+    uint8 array `buf`, clipped to the image. The disk matches
+    ImageDraw.ellipse((x-r, y-r, x+r, y+r)) for the radii used here.
+    Uses the Numba kernel when available, else one fancy-indexed write.
+    """
+    if _stamp_disks_kernel is not None and buf.flags.c_contiguous:
+        _stamp_disks_kernel(buf, np.ascontiguousarray(xs, np.int64), np.ascontiguousarray(ys, np.int64),
+                            int(radius), np.asarray(color, np.uint8))
+        return
+    h, w = buf.shape[:2]
+    dy, dx = np.mgrid[-radius:radius+1, -radius:radius+1]
+    disk = dx**2 + dy**2 <= radius*radius + radius//2
+    yy = (np.asarray(ys)[:, None] + dy[disk]).ravel()
+    xx = (np.asarray(xs)[:, None] + dx[disk]).ravel()
+    inside = (yy >= 0) & (yy < h) & (xx >= 0) & (xx < w)
+    buf[yy[inside], xx[inside]] = color
+
+@functools.lru_cache(maxsize=4)
+def _load_smplx(model_path, gender):
+    """Load the SMPL-X model (100MB+ of .npz) once per (model_path, gender)."""
+    return smplx.SMPLX(model_path,
         gender=gender,
         use_face_contour=True,
         ext='npz')
-    betas = torch.zeros([1, 10])
-    body_pose = torch.zeros([1, 21, 3])
-    global_orient = torch.zeros([1, 3])
-    transl = torch.zeros([1, 3])
-    output = model(betas=betas, body_pose=body_pose, global_orient=global_orient, transl=transl)
-    vertices = output.vertices.detach().cpu().numpy().squeeze()
-    faces = model.faces
+
+@functools.lru_cache(maxsize=4)
+def _rest_pose(model_path, gender):
+    """
+    Zero-parameter SMPL-X vertices and faces. Every avatar uses zero betas/pose,
+    so the LBS forward pass is run once per (model_path, gender) and reused.
+    """
+    model = _load_smplx(model_path, gender)
+    with torch.no_grad():
+        output = model(betas=torch.zeros([1, 10]), body_pose=torch.zeros([1, 21, 3]),
+                       global_orient=torch.zeros([1, 3]), transl=torch.zeros([1, 3]))
+    vertices = output.vertices.cpu().numpy().squeeze()
+    vertices.setflags(write=False)  # shared across calls
+    return vertices, model.faces
+
+def _planar_uv(vertices):
+    """Simple planar UV mapping: x/y normalized to [0, 1] over the mesh bounds."""
+    xy = vertices[:, :2]
+    lo = xy.min(axis=0)
+    return (xy - lo) / np.ptp(xy, axis=0)
+
+def write_obj(path, vertices, faces, header=""):
+    """Write a bare v/f OBJ with np.savetxt instead of trimesh's Python string builder."""
+    with open(path, 'w') as obj_file:
+        obj_file.write(header)
+        np.savetxt(obj_file, vertices, fmt='v %.6f %.6f %.6f')
+        np.savetxt(obj_file, np.asarray(faces) + 1, fmt='f %d %d %d')
+
+def fit_smplx_to_landmarks(landmarks, model_path, gender="neutral", out_path="avatar.obj", image_path=None, skin_color=None, eye_color=None, clothes_option=None, emit_obj=False):
+    """
+    Builds the textured SMPL-X avatar and exports it as GLB (returned path).
+    The OBJ/MTL pair is only written when emit_obj=True, or as a fallback if
+    the GLB export fails.
+    """
+    vertices, faces = _rest_pose(model_path, gender)
     mesh = trimesh.Trimesh(vertices, faces)
+    uv = _planar_uv(vertices)
     # Automatically export UV template for user overlay design
     try:
-        export_uv_template(vertices)
+        export_uv_template(uv, texture_size=512)
     except Exception as e:
         print(f"[WARN] Could not export UV template: {e}")
     # Remove previous outputs if they exist
@@ -60,7 +132,6 @@ def fit_smplx_to_landmarks(landmarks, model_path, gender="neutral", out_path="av
     # 2. Overlay user's face crop, aligned using face landmarks if possible
     if image_path is not None and os.path.exists(image_path):
         try:
-            from image_utils import detect_faces, extract_face_landmarks, crop_face
             # Get face crop and landmarks
             boxes = detect_faces(image_path)
             if boxes:
@@ -97,9 +168,14 @@ def fit_smplx_to_landmarks(landmarks, model_path, gender="neutral", out_path="av
         print(f"[DEBUG] Outfit path: {outfit_path}")
         if outfit_path:
             clothing = Image.open(outfit_path).convert("RGBA").resize((texture_size, texture_size))
-            texture_img = texture_img.convert("RGBA")
-            texture_img = Image.alpha_composite(texture_img, clothing)
-            texture_img = texture_img.convert("RGB")
+            # Blend in uint16 over the opaque RGB texture: one pass, no RGBA round-trip
+            fg = np.asarray(clothing, np.uint8)
+            a = fg[..., 3:4].astype(np.uint16)
+            out = fg[..., :3].astype(np.uint16) * a
+            out += np.asarray(texture_img, np.uint8).astype(np.uint16) * (255 - a)
+            out += 127
+            out //= 255
+            texture_img = Image.fromarray(out.astype(np.uint8), 'RGB')
             print(f"[INFO] Fashion outfit overlaid (alpha blend): {outfit_path}")
         else:
             print(f"[INFO] No fashion outfit found for gender: {gender} (searched for male_outfit/female_outfit with .png/.jpg/.jpeg)")
@@ -121,16 +197,6 @@ def fit_smplx_to_landmarks(landmarks, model_path, gender="neutral", out_path="av
         print(f"[DEBUG] Texture file exists, removing: {user_image_path}")
         os.remove(user_image_path)
     texture_img.save(user_image_path)
-    # Write MTL file
-    mtl_path = out_path.replace('.obj', '.mtl')
-    mtl_name = os.path.basename(mtl_path)
-    texture_name = os.path.basename(user_image_path)
-    with open(mtl_path, 'w') as mtl:
-        mtl.write(f"newmtl skin\nKa 1.0 1.0 1.0\nKd 1.0 1.0 1.0\nKs 0.0 0.0 0.0\nd 1.0\nillum 2\nmap_Kd {texture_name}\n")
-    # Assign UVs to mesh (simple planar mapping)
-    uv = np.zeros((vertices.shape[0], 2))
-    uv[:, 0] = (vertices[:, 0] - vertices[:, 0].min()) / (vertices[:, 0].max() - vertices[:, 0].min())
-    uv[:, 1] = (vertices[:, 1] - vertices[:, 1].min()) / (vertices[:, 1].max() - vertices[:, 1].min())
     # Set mesh vertex colors to skin color for all vertices
     if skin_color is not None:
         if len(skin_color) == 3:
@@ -140,15 +206,21 @@ def fit_smplx_to_landmarks(landmarks, model_path, gender="neutral", out_path="av
         mesh.visual.vertex_colors = np.tile(vertex_color, (vertices.shape[0], 1))
     # Assign texture as well
     mesh.visual = trimesh.visual.texture.TextureVisuals(uv=uv, image=np.array(texture_img))
-    # Write OBJ with mtllib at the top and usemtl before faces
-    try:
-        with open(out_path, 'w') as obj_file:
-            obj_file.write(f"mtllib {mtl_name}\nusemtl skin\n")
-            mesh.export(obj_file, file_type='obj', include_texture=False)
-    except Exception as e:
-        print(f"[WARN] Failed to write OBJ: {e}")
+    def _export_obj():
+        # Write MTL file, then OBJ with mtllib at the top and usemtl before faces
+        mtl_path = out_path.replace('.obj', '.mtl')
+        texture_name = os.path.basename(user_image_path)
+        with open(mtl_path, 'w') as mtl:
+            mtl.write(f"newmtl skin\nKa 1.0 1.0 1.0\nKd 1.0 1.0 1.0\nKs 0.0 0.0 0.0\nd 1.0\nillum 2\nmap_Kd {texture_name}\n")
+        try:
+            write_obj(out_path, mesh.vertices, mesh.faces, header=f"mtllib {os.path.basename(mtl_path)}\nusemtl skin\n")
+        except Exception as e:
+            print(f"[WARN] Failed to write OBJ: {e}")
+
+    if emit_obj:
+        _export_obj()
 
-    # Also export as GLB for web delivery (preferred)
+    # GLB is the delivered artifact for web
     glb_path = os.path.splitext(out_path)[0] + '.glb'
     try:
         # trimesh can export GLB including textures when mesh.visual has TextureVisuals
@@ -157,33 +229,40 @@ def fit_smplx_to_landmarks(landmarks, model_path, gender="neutral", out_path="av
         return glb_path
     except Exception as e:
         print(f"[WARN] GLB export failed: {e} - returning OBJ path")
+        if not emit_obj:
+            _export_obj()
         return out_path
 
+_FONT = None
+
+def _get_font():
+    # Parse the TTF once per process
+    global _FONT
+    if _FONT is None:
+        try:
+            _FONT = ImageFont.truetype("arial.ttf", 18)
+        except OSError:
+            _FONT = ImageFont.load_default()
+    return _FONT
+
 def generate_avatar_silhouette(landmarks, mask_img, out_path):
     avatar = Image.new('RGBA', mask_img.size, (255,255,255,0))
-    draw = ImageDraw.Draw(avatar)
     avatar.paste(mask_img, (0,0), mask_img)
     img_np = np.array(mask_img.convert('RGB'))
-    avg_color = tuple(np.mean(img_np[img_np[:,:,0]>0], axis=0).astype(int)) if np.any(img_np[:,:,0]>0) else (200, 180, 160)
+    # Masked mean in one OpenCV pass, without materializing the selected pixels
+    mask8 = (img_np[:,:,0] > 0).astype(np.uint8)
+    avg_color = tuple(int(c) for c in cv2.mean(img_np, mask=mask8)[:3]) if mask8.any() else (200, 180, 160)
     overlay = Image.new('RGBA', mask_img.size, avg_color + (80,))
     avatar = Image.alpha_composite(avatar, overlay)
-    highlight_indices = [11,12,23,24,25,26,27,28]
-    for i in highlight_indices:
-        if i < len(landmarks):
-            x = int(landmarks[i].x * mask_img.width)
-            y = int(landmarks[i].y * mask_img.height)
-            draw.ellipse((x-8, y-8, x+8, y+8), fill=(255,0,0,128))
-    for lm in landmarks:
-        x = int(lm.x * mask_img.width)
-        y = int(lm.y * mask_img.height)
-        draw.ellipse((x-3, y-3, x+3, y+3), fill=(0,255,0,128))
-    font = None
-    try:
-        from PIL import ImageFont
-        font = ImageFont.truetype("arial.ttf", 18)
-    except:
-        font = None
-    draw.text((10,10), "Body Shape & Structure", fill=(0,0,0,255), font=font)
+    # Stamp landmark markers straight into the composited pixels
+    buf = np.array(avatar)
+    pts = np.array([(lm.x * mask_img.width, lm.y * mask_img.height) for lm in landmarks]).astype(np.int32).reshape(-1, 2)
+    highlight_indices = [i for i in (11,12,23,24,25,26,27,28) if i < len(pts)]
+    stamp_disks(buf, pts[highlight_indices, 0], pts[highlight_indices, 1], 8, (255,0,0,128))
+    stamp_disks(buf, pts[:, 0], pts[:, 1], 3, (0,255,0,128))
+    avatar = Image.fromarray(buf, 'RGBA')
+    draw = ImageDraw.Draw(avatar)
+    draw.text((10,10), "Body Shape & Structure", fill=(0,0,0,255), font=_get_font())
     avatar.save(out_path)
     return out_path
 
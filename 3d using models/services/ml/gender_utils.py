@@ -1,6 +1,60 @@
 import cv2
 import numpy as np
 import os
+from functools import lru_cache
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+# OpenCV's ResNet-10 SSD face detector (deploy.prototxt + res10_300x300_ssd_iter_140000.caffemodel)
+FACE_PROTO = os.path.join(MODELS_DIR, "deploy.prototxt")
+FACE_MODEL = os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+FACE_CONFIDENCE = 0.5
+
+def _set_target(net):
+    if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
+    else:
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+@lru_cache(maxsize=None)
+def _load_gender_net(proto_path, model_path):
+    return _set_target(cv2.dnn.readNetFromCaffe(proto_path, model_path))
+
+@lru_cache(maxsize=None)
+def _load_face_net(proto_path, model_path):
+    return _set_target(cv2.dnn.readNetFromCaffe(proto_path, model_path))
+
+@lru_cache(maxsize=None)
+def _load_face_cascade():
+    return cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+def _detect_face(img):
+    """
+    Return the (x, y, w, h) of the main face in a BGR image, or None.
+    Uses the SSD face detector when its model files are present, else falls back to Haar.
+    """
+    if os.path.exists(FACE_PROTO) and os.path.exists(FACE_MODEL):
+        net = _load_face_net(FACE_PROTO, FACE_MODEL)
+        h, w = img.shape[:2]
+        net.setInput(cv2.dnn.blobFromImage(img, 1.0, (300, 300), (104.0, 177.0, 123.0)))
+        detections = net.forward()[0, 0]
+        best = detections[detections[:, 2].argmax()] if len(detections) else None
+        if best is None or best[2] < FACE_CONFIDENCE:
+            return None
+        x1, y1, x2, y2 = (best[3:7] * np.array([w, h, w, h])).astype(int)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(w, x2), min(h, y2)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return (x1, y1, x2 - x1, y2 - y1)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = _load_face_cascade().detectMultiScale(gray, 1.3, 5)
+    if len(faces) == 0:
+        return None
+    # Use the largest detected face (main face)
+    return max(faces, key=lambda rect: rect[2] * rect[3])
 
 def detect_gender(image_path, proto_path=None, model_path=None):
     """
@@ -8,14 +62,14 @@ def detect_gender(image_path, proto_path=None, model_path=None):
     """
     # Use provided paths or default to models/ directory
     if proto_path is None:
-        proto_path = os.path.join(os.path.dirname(__file__), "models", "deploy_gender.prototxt")
+        proto_path = os.path.join(MODELS_DIR, "deploy_gender.prototxt")
     if model_path is None:
-        model_path = os.path.join(os.path.dirname(__file__), "models", "gender_net.caffemodel")
+        model_path = os.path.join(MODELS_DIR, "gender_net.caffemodel")
     if not os.path.exists(proto_path) or not os.path.exists(model_path):
         print(f"Gender model files not found at:\n{proto_path}\n{model_path}")
         return 'neutral'
 
-    net = cv2.dnn.readNetFromCaffe(proto_path, model_path)
+    net = _load_gender_net(proto_path, model_path)
     gender_list = ['male', 'female']
 
     img = cv2.imread(image_path)
@@ -23,18 +77,13 @@ def detect_gender(image_path, proto_path=None, model_path=None):
         print("Image not found or cannot be read.")
         return 'neutral'
 
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-    if len(faces) == 0:
+    face = _detect_face(img)
+    if face is None:
         print("No face detected. Using full image.")
-        face_img = img.copy()
+        face_img = img
     else:
-        # Use the largest detected face (main face)
-        largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
-        (x, y, w, h) = largest_face
-        face_img = img[y:y+h, x:x+w].copy()
+        (x, y, w, h) = face
+        face_img = img[y:y+h, x:x+w]
 
     blob = cv2.dnn.blobFromImage(face_img, 1.0, (227, 227), (78.4263377603, 87.7689143744, 114.895847746), swapRB=False)
     net.setInput(blob)
@@ -7,16 +7,22 @@ Corresponds to figures & charts in the uploaded paper. Source: uploaded PDF. :co
 """
 
 import os
+import sys
+import gc
 import math
+import matplotlib
+matplotlib.use('Agg')  # files only, no GUI backend
+import hashlib
+import inspect
+import shutil
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 import networkx as nx
 from graphviz import Digraph
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
-import pandas as pd
-
-# Configure Graphviz executable path for Windows
-GRAPHVIZ_DOT = r'C:\Program Files\Graphviz\bin\dot.exe'
+import dot_cache
 
 OUT_DIR = "output_figures"
 os.makedirs(OUT_DIR, exist_ok=True)
@@ -24,12 +30,52 @@ os.makedirs(OUT_DIR, exist_ok=True)
 # ---------------------------
 # Helper: save matplotlib nicely
 # ---------------------------
-def savefig(fig, name, dpi=200, bbox_inches='tight'):
+def savefig(fig, name, dpi=200, bbox_inches=None):
+    # Lay out once up front; bbox_inches='tight' would render the figure twice per save
     path = os.path.join(OUT_DIR, name)
+    fig.tight_layout()
     fig.savefig(path, dpi=dpi, bbox_inches=bbox_inches)
     plt.close(fig)
     print("Saved:", path)
 
+def cached_fig(name, inputs, build_fn):
+    # Skip the render when the PNG was made from the same inputs and builder source;
+    # the key is kept in a hidden side-car file next to the figure.
+    path = os.path.join(OUT_DIR, name)
+    side = os.path.join(OUT_DIR, f".{name}.hash")
+    key = hashlib.sha256((repr(inputs) + inspect.getsource(build_fn)).encode()).hexdigest()
+    if os.path.exists(path) and os.path.exists(side):
+        with open(side) as f:
+            if f.read() == key:
+                # Touch it so is_stale() stops flagging it after an unrelated edit to this file
+                os.utime(path)
+                print("Up to date:", path)
+                return
+    savefig(build_fn(), name)
+    with open(side, 'w') as f:
+        f.write(key)
+
+# ---------------------------
+# Helper: the make_* diagram builders only queue their DOT source; flush_dots()
+# renders everything that is not cached yet in one go (see dot_cache.py).
+# ---------------------------
+_pending_dots = []  # (dot_source, out_path)
+
+def queue_dot(dot_source, out_path):
+    _pending_dots.append((dot_source, out_path))
+
+def flush_dots():
+    jobs = list(_pending_dots)
+    _pending_dots.clear()
+    for cached, (_, out) in zip(dot_cache.render_many([src for src, _ in jobs]), jobs):
+        shutil.copyfile(cached, out)
+        print("Saved:", out)
+
+def render_dot(dot_source, out_path):
+    queue_dot(dot_source, out_path)
+    flush_dots()
+    return out_path
+
 # ---------------------------
 # 1) Block diagram (Figure I)
 # ---------------------------
@@ -52,23 +98,7 @@ def make_block_diagram():
     dot.edge('TryOn', 'Post')
     dot.edge('Post', 'GUI')
 
-    # Use the specific executable path
-    import subprocess
-    import tempfile
-    
-    # Save the dot source to a temporary file
-    temp_dot = tempfile.NamedTemporaryFile(mode='w', suffix='.dot', delete=False)
-    temp_dot.write(dot.source)
-    temp_dot.close()
-    
-    # Generate the output using the specific dot executable
-    output_path = os.path.join(OUT_DIR, 'figure_block_diagram.png')
-    subprocess.run([GRAPHVIZ_DOT, '-Tpng', temp_dot.name, '-o', output_path], check=True)
-    
-    # Clean up
-    os.unlink(temp_dot.name)
-    
-    print("Saved:", output_path)
+    queue_dot(dot.source, os.path.join(OUT_DIR, 'figure_block_diagram.png'))
 
 # ---------------------------
 # 2) System architecture diagram (Figure II)
@@ -129,8 +159,7 @@ def make_workflow_diagram():
     for i in range(len(steps)-1):
         dot.edge(steps[i][0], steps[i+1][0])
 
-    out = dot.render(filename=os.path.join(OUT_DIR, 'figure_workflow'), cleanup=True)
-    print("Saved:", out)
+    queue_dot(dot.source, os.path.join(OUT_DIR, 'figure_workflow.png'))
 
 # ---------------------------
 # 4) Complete interaction diagram (Figure IV)
@@ -156,8 +185,7 @@ def make_interaction_diagram():
     dot.edge('B', 'F', label='deliver asset & metadata')
     dot.edge('F', 'U', label='render & show')
 
-    out = dot.render(filename=os.path.join(OUT_DIR, 'figure_interaction_diagram'), cleanup=True)
-    print("Saved:", out)
+    queue_dot(dot.source, os.path.join(OUT_DIR, 'figure_interaction_diagram.png'))
 
 # ---------------------------
 # 5) Charts: Latency across modes (Figure V)
@@ -168,35 +196,39 @@ def make_latency_chart():
     means = [2.1, 2.6, 2.3]     # seconds
     stds = [0.4, 0.5, 0.3]
 
-    fig, ax = plt.subplots(figsize=(6,4))
-    x = np.arange(len(modes))
-    ax.bar(x, means, yerr=stds, capsize=8)
-    ax.set_xticks(x)
-    ax.set_xticklabels(modes)
-    ax.set_ylabel('Latency (s)')
-    ax.set_title('Rendering Latency across Deployment Modes\n(average ± std)')
-    for i, v in enumerate(means):
-        ax.text(i, v+0.05, f"{v:.2f}s", ha='center')
-    savefig(fig, 'figure_latency_modes.png')
+    def build():
+        fig, ax = plt.subplots(figsize=(6,4))
+        x = np.arange(len(modes))
+        ax.bar(x, means, yerr=stds, capsize=8)
+        ax.set_xticks(x)
+        ax.set_xticklabels(modes)
+        ax.set_ylabel('Latency (s)')
+        ax.set_title('Rendering Latency across Deployment Modes\n(average ± std)')
+        for i, v in enumerate(means):
+            ax.text(i, v+0.05, f"{v:.2f}s", ha='center')
+        return fig
+    cached_fig('figure_latency_modes.png', (modes, means, stds), build)
 
 # ---------------------------
 # 6) Scalability plot (Figure VI)
 # ---------------------------
 def make_scalability_plot():
     # synthetic example to mirror paper statement: latency vs concurrent users
-    concurrent = np.array([1, 5, 10, 20, 30, 50])
+    concurrent = [1, 5, 10, 20, 30, 50]
     # derived roughly from text (paper reports 2.5 sec avg and 3.1 sec at 50 users)
-    latency = np.array([2.1, 2.3, 2.6, 2.8, 2.95, 3.1])
-
-    fig, ax = plt.subplots(figsize=(7,4))
-    ax.plot(concurrent, latency, marker='o')
-    ax.set_xlabel('Concurrent Users')
-    ax.set_ylabel('Average Latency (s)')
-    ax.set_title('Scalability: Average Latency vs Concurrent Users')
-    ax.grid(True, linestyle='--', linewidth=0.5)
-    for x,y in zip(concurrent, latency):
-        ax.text(x, y+0.03, f"{y:.2f}", ha='center', fontsize=8)
-    savefig(fig, 'figure_scalability.png')
+    latency = [2.1, 2.3, 2.6, 2.8, 2.95, 3.1]
+
+    def build():
+        fig, ax = plt.subplots(figsize=(7,4))
+        ax.plot(concurrent, latency, marker='o')
+        ax.set_xlabel('Concurrent Users')
+        ax.set_ylabel('Average Latency (s)')
+        ax.set_title('Scalability: Average Latency vs Concurrent Users')
+        ax.grid(True, linestyle='--', linewidth=0.5)
+        for x,y in zip(concurrent, latency):
+            ax.text(x, y+0.03, f"{y:.2f}", ha='center', fontsize=8)
+        return fig
+    cached_fig('figure_scalability.png', (concurrent, latency), build)
 
 # ---------------------------
 # 7) Robust 3D asset conversion success rate (Figure VII)
@@ -205,10 +237,13 @@ def make_conversion_success_chart():
     # paper reports 97% success.
     success = 97
     fail = 100 - success
-    fig, ax = plt.subplots(figsize=(5,5))
-    ax.pie([success, fail], labels=[f"Success {success}%", f"Failed {fail}%"], autopct='%1.0f%%', startangle=90)
-    ax.set_title('3D Asset Preprocessing Success Rate\n(GLTF → GLB)')
-    savefig(fig, 'figure_conversion_success.png')
+
+    def build():
+        fig, ax = plt.subplots(figsize=(5,5))
+        ax.pie([success, fail], labels=[f"Success {success}%", f"Failed {fail}%"], autopct='%1.0f%%', startangle=90)
+        ax.set_title('3D Asset Preprocessing Success Rate\n(GLTF → GLB)')
+        return fig
+    cached_fig('figure_conversion_success.png', (success, fail), build)
 
 # ---------------------------
 # 8) Usability results (Figure VIII)
@@ -218,14 +253,16 @@ def make_usability_chart():
     categories = ['Avatar creation\n(intuitive)', 'Wardrobe\n(helpful)', 'Visualization\n(realism)']
     values = [80, 90, 70]
 
-    fig, ax = plt.subplots(figsize=(6,4))
-    bars = ax.bar(categories, values)
-    ax.set_ylim(0, 100)
-    ax.set_ylabel('Percent (%)')
-    ax.set_title('Usability Study Results')
-    for bar, v in zip(bars, values):
-        ax.text(bar.get_x() + bar.get_width()/2, v+2, f"{v}%", ha='center')
-    savefig(fig, 'figure_usability.png')
+    def build():
+        fig, ax = plt.subplots(figsize=(6,4))
+        bars = ax.bar(categories, values)
+        ax.set_ylim(0, 100)
+        ax.set_ylabel('Percent (%)')
+        ax.set_title('Usability Study Results')
+        for bar, v in zip(bars, values):
+            ax.text(bar.get_x() + bar.get_width()/2, v+2, f"{v}%", ha='center')
+        return fig
+    cached_fig('figure_usability.png', (categories, values), build)
 
 # ---------------------------
 # 9) Table images: hardware & software config (simple table snapshots)
@@ -242,41 +279,51 @@ def make_table_image():
             "200 Mbps broadband"
         ]
     }
-    df = pd.DataFrame(hw)
-    # render DataFrame as image using matplotlib
-    fig, ax = plt.subplots(figsize=(8,2 + 0.4*len(df)))
-    ax.axis('off')
-    table = ax.table(cellText=df.values.tolist(), colLabels=list(df.columns), cellLoc='left', loc='center')
-    table.auto_set_font_size(False)
-    table.set_fontsize(9)
-    table.scale(1, 1.5)
-    savefig(fig, 'table_hardware_config.png')
+
+    def build_hw():
+        rows = list(zip(*hw.values()))
+        # render the table as an image using matplotlib
+        fig, ax = plt.subplots(figsize=(8,2 + 0.4*len(rows)))
+        ax.axis('off')
+        table = ax.table(cellText=rows, colLabels=list(hw.keys()), cellLoc='left', loc='center')
+        table.auto_set_font_size(False)
+        table.set_fontsize(9)
+        table.scale(1, 1.5)
+        return fig
+    cached_fig('table_hardware_config.png', hw, build_hw)
 
     sw = {
         "Component": ["Frontend", "Backend", "Database", "ML Service", "Deployment Tools"],
         "Stack": ["Next.js 14, Three.js, Tailwind CSS", "FastAPI (Python 3.10) / Node.js 18 (Express)", "MongoDB 6.0", "Python 3.10, Celery, PyTorch", "Docker, Docker Compose, Terraform (AWS)"]
     }
-    df2 = pd.DataFrame(sw)
-    fig2, ax2 = plt.subplots(figsize=(8,2 + 0.6*len(df2)))
-    ax2.axis('off')
-    table2 = ax2.table(cellText=df2.values.tolist(), colLabels=list(df2.columns), cellLoc='left', loc='center')
-    table2.auto_set_font_size(False)
-    table2.set_fontsize(9)
-    table2.scale(1, 1.4)
-    savefig(fig2, 'table_software_config.png')
+
+    def build_sw():
+        rows2 = list(zip(*sw.values()))
+        fig2, ax2 = plt.subplots(figsize=(8,2 + 0.6*len(rows2)))
+        ax2.axis('off')
+        table2 = ax2.table(cellText=rows2, colLabels=list(sw.keys()), cellLoc='left', loc='center')
+        table2.auto_set_font_size(False)
+        table2.set_fontsize(9)
+        table2.scale(1, 1.4)
+        return fig2
+    cached_fig('table_software_config.png', sw, build_sw)
 
 # ---------------------------
 # 10) Small helper: create a high-res placeholder showing "before vs after GLTF->GLB"
 # ---------------------------
+@lru_cache(maxsize=32)
+def _font(name, size):
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default()
+
 def make_before_after_placeholder():
     # create simple side-by-side image with labels (useful as illustrative figure)
     w, h = 1200, 500
     im = Image.new('RGB', (w, h), color='white')
     draw = ImageDraw.Draw(im)
-    try:
-        font = ImageFont.truetype("DejaVuSans.ttf", 20)
-    except:
-        font = ImageFont.load_default()
+    font = _font("DejaVuSans.ttf", 20)
 
     # left box (before)
     draw.rectangle([50, 50, 550, 450], outline='black', width=3)
@@ -299,15 +346,65 @@ def make_before_after_placeholder():
 # ---------------------------
 # Run everything
 # ---------------------------
+# Graphviz builders only queue DOT sources (rendered by flush_dots); the rest draw with
+# matplotlib / PIL and are independent, so they can run in separate processes.
+DIAGRAM_BUILDERS = [make_block_diagram, make_workflow_diagram, make_interaction_diagram]
+FIGURE_BUILDERS = [
+    make_system_architecture,
+    make_latency_chart,
+    make_scalability_plot,
+    make_conversion_success_chart,
+    make_usability_chart,
+    make_table_image,
+    make_before_after_placeholder,
+]
+
+# Files each builder writes; a builder is skipped when they are all newer than this script
+BUILDER_OUTPUTS = {
+    make_block_diagram: ['figure_block_diagram.png'],
+    make_workflow_diagram: ['figure_workflow.png'],
+    make_interaction_diagram: ['figure_interaction_diagram.png'],
+    make_system_architecture: ['figure_system_architecture.png'],
+    make_latency_chart: ['figure_latency_modes.png'],
+    make_scalability_plot: ['figure_scalability.png'],
+    make_conversion_success_chart: ['figure_conversion_success.png'],
+    make_usability_chart: ['figure_usability.png'],
+    make_table_image: ['table_hardware_config.png', 'table_software_config.png'],
+    make_before_after_placeholder: ['figure_before_after_conversion.png'],
+}
+
+def is_stale(build):
+    src_mtime = os.path.getmtime(__file__)
+    for name in BUILDER_OUTPUTS[build]:
+        path = os.path.join(OUT_DIR, name)
+        if not os.path.exists(path) or os.path.getmtime(path) < src_mtime:
+            return True
+    return False
+
+def _run(build):
+    # Drop any figures a builder left open so each one starts from a bounded working set
+    build()
+    plt.close('all')
+    gc.collect()
+
 if __name__ == "__main__":
-    make_block_diagram()
-    make_system_architecture()
-    make_workflow_diagram()
-    make_interaction_diagram()
-    make_latency_chart()
-    make_scalability_plot()
-    make_conversion_success_chart()
-    make_usability_chart()
-    make_table_image()
-    make_before_after_placeholder()
-    print("All figures created in:", OUT_DIR)
+    # Figures only depend on this file's constants; --force rebuilds even if they look current
+    force = "--force" in sys.argv
+    diagrams = [b for b in DIAGRAM_BUILDERS if force or is_stale(b)]
+    figures = [b for b in FIGURE_BUILDERS if force or is_stale(b)]
+    for build in diagrams:
+        build()
+    if "--singlecore" in sys.argv:
+        for build in figures:
+            _run(build)
+        flush_dots()
+    elif figures:
+        # Processes, not threads: pyplot is not thread-safe
+        with ProcessPoolExecutor(max_workers=min(len(figures), os.cpu_count())) as ex:
+            futures = [ex.submit(_run, build) for build in figures]
+            flush_dots()  # Graphviz renders overlap with the workers
+            for f in futures:
+                f.result()
+    else:
+        flush_dots()
+    print("All figures up to date in:", OUT_DIR)
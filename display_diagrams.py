@@ -7,12 +7,8 @@ without saving - just for viewing and testing
 import matplotlib.pyplot as plt
 import networkx as nx
 from graphviz import Digraph
-import tempfile
-import subprocess
-import os
-
-# Configure Graphviz executable path for Windows
-GRAPHVIZ_DOT = r'C:\Program Files\Graphviz\bin\dot.exe'
+from PIL import Image
+from dot_cache import render_dot
 
 def display_system_architecture():
     """Display enhanced large system architecture diagram using NetworkX and matplotlib"""
@@ -135,27 +131,10 @@ def display_workflow_diagram():
     for i in range(len(steps)-1):
         dot.edge(steps[i][0], steps[i+1][0], label=edge_labels[i], color='darkblue')
 
-    # Generate and display using subprocess
-    temp_dot = tempfile.NamedTemporaryFile(mode='w', suffix='.dot', delete=False)
-    temp_dot.write(dot.source)
-    temp_dot.close()
-    
-    temp_png = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-    temp_png.close()
-    
-    try:
-        subprocess.run([GRAPHVIZ_DOT, '-Tpng', temp_dot.name, '-o', temp_png.name], check=True)
-        
-        # Display the image
-        from PIL import Image
-        img = Image.open(temp_png.name)
-        img.show()
-        print("Enhanced Workflow diagram displayed!")
-        
-    finally:
-        # Clean up temp files
-        os.unlink(temp_dot.name)
-        os.unlink(temp_png.name)
+    # Display the image
+    img = Image.open(render_dot(dot.source))
+    img.show()
+    print("Enhanced Workflow diagram displayed!")
 
 def display_interaction_diagram():
     """Display enhanced large interaction diagram using Graphviz"""
@@ -201,27 +180,10 @@ def display_interaction_diagram():
     dot.edge('DB', 'B', label='[LOAD] Query Results\n& Stored Data\nDatabase Response', 
              color='chocolate', style='bold')
 
-    # Generate and display using subprocess
-    temp_dot = tempfile.NamedTemporaryFile(mode='w', suffix='.dot', delete=False)
-    temp_dot.write(dot.source)
-    temp_dot.close()
-    
-    temp_png = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-    temp_png.close()
-    
-    try:
-        subprocess.run([GRAPHVIZ_DOT, '-Tpng', temp_dot.name, '-o', temp_png.name], check=True)
-        
-        # Display the image
-        from PIL import Image
-        img = Image.open(temp_png.name)
-        img.show()
-        print("Enhanced Interaction diagram displayed!")
-        
-    finally:
-        # Clean up temp files
-        os.unlink(temp_dot.name)
-        os.unlink(temp_png.name)
+    # Display the image
+    img = Image.open(render_dot(dot.source))
+    img.show()
+    print("Enhanced Interaction diagram displayed!")
 
 def display_all_diagrams():
     """Display all three enhanced diagrams"""
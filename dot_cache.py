@@ -0,0 +1,66 @@
+"""
+dot_cache.py
+Render Graphviz DOT sources to PNG, cached by content + Graphviz version.
+Shared by Makefigures.py and display_diagrams.py.
+"""
+
+import os
+import hashlib
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+
+try:
+    import pygraphviz as pgv  # in-process Graphviz (libgvc), avoids spawning dot
+except ImportError:
+    pgv = None
+
+# Default Graphviz install location on Windows, used when dot is not on PATH
+GRAPHVIZ_DOT = r'C:\Program Files\Graphviz\bin\dot.exe'
+
+CACHE_DIR = os.path.join("output_figures", ".cache")
+
+@lru_cache(maxsize=1)
+def dot_binary():
+    """The dot executable: $GRAPHVIZ_DOT, else dot on PATH, else the Windows default."""
+    return os.environ.get('GRAPHVIZ_DOT') or shutil.which('dot') or GRAPHVIZ_DOT
+
+@lru_cache(maxsize=1)
+def _dot_version():
+    if pgv is not None:
+        return ("pygraphviz " + pgv.__version__).encode()
+    return subprocess.check_output([dot_binary(), '-V'], stderr=subprocess.STDOUT)
+
+def cache_path(dot_source):
+    key = hashlib.sha256(dot_source.encode() + _dot_version() + b"png").hexdigest()
+    return os.path.join(CACHE_DIR, key + '.png')
+
+def render_many(dot_sources):
+    """Render every source that is not cached yet and return the cached PNG paths, in order.
+    Uses pygraphviz in-process, or a single dot process when it is not installed."""
+    paths = [cache_path(src) for src in dot_sources]
+    missing = {path: src for path, src in zip(paths, dot_sources) if not os.path.exists(path)}
+    if not missing:
+        return paths
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if pgv is not None:
+        for path, src in missing.items():
+            pgv.AGraph(string=src).draw(path + '.tmp', format='png', prog='dot')
+            os.replace(path + '.tmp', path)
+        return paths
+    with tempfile.TemporaryDirectory() as tmp:
+        dot_paths = {}
+        for path, src in missing.items():
+            dot_paths[path] = os.path.join(tmp, os.path.basename(path)[:-4] + '.dot')
+            with open(dot_paths[path], 'w') as f:
+                f.write(src)
+        # -O writes <name>.dot.png next to each input file
+        subprocess.run([dot_binary(), '-Tpng', *dot_paths.values(), '-O'], check=True)
+        for path, dot_path in dot_paths.items():
+            shutil.move(dot_path + '.png', path)
+    return paths
+
+def render_dot(dot_source):
+    """Render DOT source to PNG (or reuse a cached render) and return the PNG path"""
+    return render_many([dot_source])[0]